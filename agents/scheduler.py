@@ -3,7 +3,7 @@ from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
 
 from db import QuantDB
-from quant.llm import ModelScopeClinet, OllamaClient
+from quant.llm import ModelScopeClinet, OllamaClient, CachedLLMClient
 from utils.time import *
 from utils.logger import logger
 from config import CRITICAL_STOCKS_US 
@@ -24,6 +24,10 @@ def strategy_job(name:str, strategy, dragon):
     strategy.update_latest()
     dragon.run_growth(days_delta(today_str(), -1))
 
+def maintain_job(name:str, db):
+    logger.info(f"⚠️  job {name} starting...")
+    db.maintain()
+
 def hour_job(name:str, spider, strategy, dragon, worker):
     logger.info(f"⚠️  {name} 执行中... ({datetime.now().strftime('%Y-%m-%d %H:%M:%S')})")
     #CRITICAL_STOCKS_US = ["BTC-USD", "XPEV"]
@@ -48,7 +52,8 @@ class Scheduler:
             max_leverage = 1.2,            
             is_long_only = False,
         )
-        self.strategy = StrategyHelper(ModelScopeClinet(), QuantDB())
+        self.db = QuantDB()
+        self.strategy = StrategyHelper(CachedLLMClient(ModelScopeClinet(), self.db), self.db)
         #self.strategy = StrategyHelper(OllamaClient(), QuantDB())
 
     def start(self, hour:int=9, minute:int=0):
@@ -72,6 +77,17 @@ class Scheduler:
             }
         )
 
+        self.scheduler.add_job(
+            maintain_job,
+            "cron",
+            hour=3,
+            minute=0,
+            kwargs={
+                "name":"Database maintenance",
+                "db": self.db,
+            }
+        )
+
         """
         self.scheduler.add_job(
             us_spider_job, 
@@ -106,3 +122,4 @@ class Scheduler:
     def shutdown(self, wait:bool=True):
         logger.info("Scheduler Agent: Scheduler shutdown...")
         self.scheduler.shutdown(wait=wait)
+        self.db.close()
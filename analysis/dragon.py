@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from db import DB
@@ -92,7 +93,7 @@ ORDER BY flag DESC, pct_change DESC;
         if flag:
             sql += f", pct_change {'DESC' if flag == 'TopGainers' else 'ASC'}"  
         df = self.db.query(sql) 
-        df['pct_change'] = df['pct_change'].apply(lambda x: f"{x:.2f}%")
+        df['pct_change'] = np.char.mod("%.2f%%", df['pct_change'].to_numpy(dtype=float))
         return df
 
     def run_report(self, date:str, top_k:int=10, days:int=5):
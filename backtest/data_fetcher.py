@@ -44,10 +44,11 @@ class DataFetcher:
 
     def fetch_us_macro(self, start:str|None=None, end:str|None=None):
         logger.info(f"Fetching US Macro data from db")
-        return {symbol:self.db.query_stock_price(
-            symbol = symbol,
+        dfs = self.db.query_stock_price_many(
+            symbols = ['VIX', 'IXIC'],
             interval = 'daily',
             start_date = start,
             end_date = end,
-        )[self.fields] for symbol in ['VIX', 'IXIC']}
+        )
+        return {symbol:df[self.fields] for symbol, df in dfs.items()}
 
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from utils.logger import logger
 from core.interval import INTERVAL
@@ -52,13 +53,29 @@ class OHLCData:
         if not has_symbol:
             df["symbol"] = "DEFAULT"
 
-        if not isinstance(df.index, pd.DatetimeIndex):
-            df.index = pd.to_datetime(df['date'])
-        
-        df_week = (df.groupby("symbol")
-                   .resample('W-MON', closed='left', label='left')
-                   .agg(self.logic)
-                   .reset_index())
+        # 以整数周编号分组（1970-01-01 为周四，+3 后按周一对齐），等价于 resample('W-MON', closed='left', label='left')
+        dates = df.index if isinstance(df.index, pd.DatetimeIndex) else pd.to_datetime(df['date'])
+        days = np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+        if not (np.diff(days) >= 0).all():
+            order = np.argsort(days, kind="stable")
+            df, days = df.iloc[order], days[order]
+        df["_week"] = (days + 3) // 7
+        df_week = df.groupby(["symbol", "_week"]).agg(self.logic)
+
+        # resample 会为区间内无交易的周补空行（sum 列为 0），这里按每个 symbol 的周范围补齐
+        bounds = df_week.index.to_frame(index=False).groupby("symbol")["_week"].agg(["min", "max"])
+        if (bounds["max"] - bounds["min"] + 1).sum() != len(df_week):
+            full = pd.MultiIndex.from_tuples(
+                [(s, w) for s, lo, hi in bounds.itertuples() for w in range(lo, hi + 1)], names=["symbol", "_week"]
+            )
+            dtypes = df_week.dtypes
+            df_week = df_week.reindex(full)
+            for col, how in self.logic.items():
+                if how == "sum":
+                    df_week[col] = df_week[col].fillna(0).astype(dtypes[col])
+
+        df_week = df_week.reset_index()
+        df_week.insert(1, "date", (df_week.pop("_week").to_numpy() * 7 - 3).astype("datetime64[D]"))
 
         all_cols = self.data.columns
         for col in all_cols:
@@ -66,7 +83,7 @@ class OHLCData:
                 mapping = df.groupby("symbol")[col].first()
                 df_week[col] = df_week["symbol"].map(mapping)
 
-        df_week["date"] = df_week['date'].dt.strftime('%Y-%m-%d')
+        df_week["date"] = np.datetime_as_string(df_week["date"].to_numpy(dtype="datetime64[D]"), unit="D")
         
         if not has_symbol:
             df_week.drop(columns=["symbol"], inplace=True)
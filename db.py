@@ -1,11 +1,16 @@
-import io
 import os
 import json
+import queue
+import orjson
 import sqlite3
+import operator
 import threading
 import numpy as np
+from itertools import islice
+from collections import namedtuple
 import pandas as pd
-from typing import List, Dict, Tuple, Any, Optional
+from contextlib import contextmanager
+from typing import List, Dict, Tuple, Any, Optional, Union
 from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy import (
     create_engine, 
@@ -14,69 +19,307 @@ from sqlalchemy import (
     MetaData, 
     UniqueConstraint
 )
+from sqlalchemy.pool import QueuePool
 from utils.time import str2date
 from utils.logger import logger
 from core.interval import DAY_INTERVAL
 from trade.config import TradeConfig
 
+# 批量写入的分块大小：原生 executemany 按行绑定，SQLAlchemy 路径需控制单次参数量
+BATCH_CHUNK_SIZE = 5000
+UPSERT_CHUNK_SIZE = 1000
+# 每个连接缓存的预编译语句数（sqlite3 默认 128）
+STATEMENT_CACHE_SIZE = 200
+# 多 symbol 批量查询时 IN (...) 的分组大小，低于 SQLite 绑定参数上限
+IN_CHUNK_SIZE = 500
+# LLM 响应缓存保留天数：超期记录在 maintain 时清理，读取时也视为未命中
+LLM_CACHE_TTL_DAYS = 30
+
+def _dumps(obj: Any) -> str:
+    """orjson 序列化为 str，numpy 标量/数组直接支持；非 str 键与 json.dumps 一样转为字符串"""
+    return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+
+def _loads(raw: Union[bytes, str]) -> Any:
+    """orjson 解析；旧数据由 json.dumps 写入，可能含 orjson 不接受的 NaN/Infinity，回退标准库"""
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return json.loads(raw)
+
+def _day_str(s: pd.Series, errors: str = "raise") -> pd.Series:
+    """日期列截取为 YYYY-MM-DD：库中为规范格式时直接切片，否则回退到 to_datetime + strftime"""
+    if pd.api.types.is_string_dtype(s):
+        head = s.str.slice(0, 10)
+        if head.str.len().eq(10).all() and head.str[4].eq("-").all() and head.str[7].eq("-").all():
+            return head
+    return pd.to_datetime(s, errors=errors).dt.strftime("%Y-%m-%d")
+
+# 连接级 PRAGMA：每个新连接执行一次；journal_mode=WAL 为库级持久设置，仅在 DB 初始化时执行
+CONNECTION_PRAGMAS = ("cache_size=-65536", "temp_store=MEMORY", "mmap_size=268435456")  # 64MB 页缓存，256MB 内存映射读
+WRITE_PRAGMAS = ("synchronous=NORMAL",)  # WAL 下仅在 checkpoint 时 fsync
+READ_PRAGMAS = ("query_only=1", "read_uncommitted=0")  # 只读连接：WAL 下与写连接互不阻塞
+
+# 表元数据缓存：唯一约束列、可更新列、SQLAlchemy upsert 语句及按列集合缓存的原生 SQL
+TableMeta = namedtuple("TableMeta", ["table", "conflict_cols", "non_conflict_cols", "upsert_stmt", "raw_sql"])
+
+
+class _RWLock:
+    """读写锁：普通读写共享持有，DDL/关闭独占；同一线程可重入，写优先避免独占方饥饿"""
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._shared = 0
+        self._exclusive_owner = None
+        self._waiting = 0
+
+    @contextmanager
+    def shared(self):
+        me = threading.get_ident()
+        depth = getattr(self._local, "depth", 0)
+        if depth or self._exclusive_owner == me:
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth = depth
+            return
+        with self._cond:
+            while self._exclusive_owner is not None or self._waiting:
+                self._cond.wait()
+            self._shared += 1
+        self._local.depth = 1
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            with self._cond:
+                self._shared -= 1
+                if not self._shared: self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        me = threading.get_ident()
+        if self._exclusive_owner == me:
+            yield
+            return
+        if getattr(self._local, "depth", 0):
+            raise RuntimeError("持有共享锁时不能申请独占锁")
+        with self._cond:
+            self._waiting += 1
+            while self._exclusive_owner is not None or self._shared:
+                self._cond.wait()
+            self._waiting -= 1
+            self._exclusive_owner = me
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._exclusive_owner = None
+                self._cond.notify_all()
+
 
 class DB:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, pool_size: int = 4):
         self.db_path = db_path
         os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
-        self.engine = create_engine(f'sqlite:///{db_path}', echo=False)
+        # SQLAlchemy 引擎与原生 sqlite3 连接共用 create_connection，连接参数与 PRAGMA 保持一致
+        self.engine = create_engine(f'sqlite:///{db_path}', echo=False, creator=self.create_connection,
+                                    poolclass=QueuePool, pool_size=1, max_overflow=4, pool_recycle=-1)
         self.metadata = MetaData()
-        self._lock = threading.Lock() 
+        self._lock = threading.RLock() 
+        self._rw = _RWLock()
+        # 事务状态按线程记录：写连接由 _lock 串行，只有持有事务的线程才处于事务中
+        self._tx = threading.local()
+        self._vacuum_warned = False
+        # 单写连接 + 读连接池，避免每次调用重复打开数据库文件
+        self._write_conn = None
+        self._read_pool = queue.Queue(maxsize=pool_size)
+        with self._conn(write=True) as conn:
+            # auto_vacuum 只能在建表前设定（对已有库无效，需 VACUUM 一次才切换），须先于 WAL 执行
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
         try:
             self.metadata.reflect(bind=self.engine)
         except:
             pass
         self._table_cache = {}
+        self._schema_version = 0
+
+    def _table_meta(self, table_name: str) -> Optional[TableMeta]:
+        """反射表结构并缓存约束信息，DDL 执行后按版本号失效"""
+        cached = self._table_cache.get(table_name)
+        if cached is not None and cached[0] == self._schema_version:
+            return cached[1]
+        try:
+            stale = self.metadata.tables.get(table_name)
+            if stale is not None: self.metadata.remove(stale)
+            self.metadata.reflect(bind=self.engine, only=[table_name])
+            table = self.metadata.tables.get(table_name)
+        except:
+            return None
+        if table is None: return None
+        return self._cache_table_meta(table)
+
+    def _cache_table_meta(self, table: Table) -> TableMeta:
+        conflict_cols = []
+        for c in table.constraints:
+            if isinstance(c, UniqueConstraint):
+                conflict_cols = [col.name for col in c.columns]
+                break
+        non_conflict_cols = [c.name for c in table.columns if c.name not in conflict_cols and not c.primary_key]
+        upsert_stmt = None
+        if conflict_cols:
+            stmt = insert(table)
+            set_ = {c: stmt.excluded[c] for c in non_conflict_cols}
+            upsert_stmt = stmt.on_conflict_do_update(index_elements=conflict_cols, set_=set_) if set_ else stmt.on_conflict_do_nothing(index_elements=conflict_cols)
+        meta = TableMeta(table, conflict_cols, non_conflict_cols, upsert_stmt, {})
+        self._table_cache[table.name] = (self._schema_version, meta)
+        return meta
+
+    def prime_table_cache(self):
+        """建表后一次性反射全部表并缓存约束信息，update() 热路径不再逐表反射"""
+        self.metadata.clear()
+        self.metadata.reflect(bind=self.engine)
+        for table in self.metadata.tables.values():
+            self._cache_table_meta(table)
 
     def _get_table(self, table_name: str) -> Table:
-        if table_name not in self._table_cache:
-            try:
-                self.metadata.reflect(bind=self.engine, only=[table_name])
-                table = self.metadata.tables.get(table_name)
-                self._table_cache[table_name] = table
-            except:
-                return None
-        return self._table_cache.get(table_name)
+        meta = self._table_meta(table_name)
+        return meta.table if meta else None
 
     def tables(self) -> List[str]:
         inspector = inspect(self.engine)
         return inspector.get_table_names()
 
-    def create_connection(self):
-        return sqlite3.connect(self.db_path, check_same_thread=False)
+    def create_connection(self, read_only: bool = False):
+        # timeout 即 busy_timeout（秒），写锁竞争时等待而非立即报错；LIMIT 等均参数化，热点语句留在预编译缓存中
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30, cached_statements=STATEMENT_CACHE_SIZE)
+        for pragma in CONNECTION_PRAGMAS + (READ_PRAGMAS if read_only else WRITE_PRAGMAS):
+            conn.execute(f"PRAGMA {pragma}")
+        return conn
+
+    @contextmanager
+    def _conn(self, write: bool = False):
+        """借出连接：写操作独占读写连接，读操作从只读连接池借还；两者对 DDL/关闭共享读写锁"""
+        if write:
+            with self._rw.shared(), self._lock:
+                if self._write_conn is None:
+                    self._write_conn = self.create_connection()
+                try:
+                    yield self._write_conn
+                except Exception:
+                    self._write_conn.rollback()
+                    raise
+            return
+
+        with self._rw.shared():
+            try:
+                conn = self._read_pool.get_nowait()
+            except queue.Empty:
+                conn = self.create_connection(read_only=True)
+            try:
+                yield conn
+            finally:
+                try:
+                    self._read_pool.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """在写连接上开启单个事务，块内的 update_sql/update 等写操作合并为一次提交"""
+        with self._conn(write=True) as conn:
+            if self._in_tx:
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            self._tx.active = True
+            try:
+                yield conn
+                conn.commit()
+            finally:
+                self._tx.active = False
+
+    @property
+    def _in_tx(self) -> bool:
+        return getattr(self._tx, "active", False)
+
+    def _commit(self, conn):
+        if not self._in_tx: conn.commit()
+
+    def close(self):
+        """关闭写连接与连接池中的全部读连接，等待进行中的读写结束"""
+        with self._rw.exclusive():
+            with self._lock:
+                if self._write_conn is not None:
+                    self._write_conn.close()
+                    self._write_conn = None
+            while True:
+                try:
+                    self._read_pool.get_nowait().close()
+                except queue.Empty:
+                    break
+            self.engine.dispose()
+
+    def maintain(self, freelist_threshold: int = 1000, vacuum_pages: int = 1000):
+        """例行维护：PRAGMA optimize 刷新统计信息，空闲页过多时增量回收；
+        已有库的 auto_vacuum 不是 INCREMENTAL(2) 时增量回收无效，只提示一次需手动 VACUUM"""
+        with self._conn(write=True) as conn:
+            conn.execute("PRAGMA optimize")
+            freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if freelist <= freelist_threshold or self._in_tx:
+                return
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                # execute 只单步执行（每次仅回收一页），executescript 才会执行到结束
+                conn.executescript(f"PRAGMA incremental_vacuum({int(vacuum_pages)})")
+                logger.info(f"Incremental vacuum: freelist {freelist} pages")
+            elif not self._vacuum_warned:
+                self._vacuum_warned = True
+                logger.warning(f"{self.db_path}: freelist {freelist} pages but auto_vacuum is not INCREMENTAL, run a one-off VACUUM to enable it")
 
     def ddl(self, ddl: Any):
-        with self._lock, self.create_connection() as conn:
+        with self._rw.exclusive(), self._conn(write=True) as conn:
             try:
                 cursor = conn.cursor()
                 statements = ddl if isinstance(ddl, list) else [ddl]
                 for d in statements:
                     cursor.execute(d)
-                conn.commit()
+                self._commit(conn)
+                self._schema_version += 1
             except Exception as e:
                 logger.error(f"DDL 执行错误: {e}")
                 raise
 
     def query(self, sql: str, params: Tuple = ()) -> pd.DataFrame:
-        with self.create_connection() as conn:
+        with self._conn() as conn:
             try:
                 return pd.read_sql(sql, conn, params=params)
             except Exception as e:
                 logger.error(f"Query Error: {sql} | {e}")
                 return pd.DataFrame()
 
+    def query_rows(self, sql: str, params: Tuple = ()) -> Tuple[List[str], List[Tuple]]:
+        """轻量查询：直接返回 (列名, 行元组列表)，不构造 DataFrame"""
+        with self._conn() as conn:
+            try:
+                cursor = conn.execute(sql, params)
+                return [d[0] for d in cursor.description], cursor.fetchall()
+            except Exception as e:
+                logger.error(f"Query Error: {sql} | {e}")
+                return [], []
+
+    def query_fast(self, sql: str, params: Tuple = ()) -> pd.DataFrame:
+        """小结果集查询：fetchall 后 DataFrame.from_records，跳过 read_sql 的类型推断"""
+        columns, rows = self.query_rows(sql, params)
+        return pd.DataFrame.from_records(rows, columns=columns)
+
     def update_sql(self, sql: str, params: Tuple = ()) -> int:
-        with self._lock, self.create_connection() as conn:
+        with self._conn(write=True) as conn:
             try:
                 cursor = conn.cursor()
                 cursor.execute(sql, params)
                 affected_rows = cursor.rowcount
-                conn.commit()
+                self._commit(conn)
                 return affected_rows
             except Exception as e:
                 logger.error(f"SQL Update Error: {sql} | {e}")
@@ -89,48 +332,106 @@ class DB:
         )
         return self.update_sql(sql, safe_values)
 
-    def update_sql_params_many(self, sql: str, values_list: List[Tuple[Any]]) -> int:
-        with self._lock, self.create_connection() as conn:
+    def _executemany_chunked(self, conn, sql: str, rows, chunk_size: int = BATCH_CHUNK_SIZE) -> int:
+        """在同一个 BEGIN IMMEDIATE 事务内分块 executemany，整批只提交一次"""
+        cursor = conn.cursor()
+        if not conn.in_transaction:
+            cursor.execute("BEGIN IMMEDIATE")
+        affected_rows = 0
+        it = iter(rows)
+        while chunk := list(islice(it, chunk_size)):
+            cursor.executemany(sql, chunk)
+            affected_rows += cursor.rowcount
+        self._commit(conn)
+        return affected_rows
+
+    @staticmethod
+    def _json_safe_rows(values_list: List[Tuple[Any]]) -> List[Tuple[Any]]:
+        """按列序列化 dict/list：扫描全部行确定含 dict/list 的列，仅对这些列逐格转换"""
+        if not values_list:
+            return values_list
+        columns = list(zip(*values_list))
+        json_cols = [i for i, col in enumerate(columns) if any(isinstance(v, (dict, list)) for v in col)]
+        if not json_cols:
+            return values_list
+        for i in json_cols:
+            columns[i] = [json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v for v in columns[i]]
+        return list(zip(*columns))
+
+    def update_sql_params_many(self, sql: str, values_list: List[Tuple[Any]], chunk_size: int = BATCH_CHUNK_SIZE) -> int:
+        with self._conn(write=True) as conn:
             try:
-                cursor = conn.cursor()
-                safe_values_list = [
-                    tuple(json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v for v in values)
-                    for values in values_list
-                ]
-                cursor.executemany(sql, safe_values_list)
-                affected_rows = cursor.rowcount
-                conn.commit()
-                return affected_rows
+                return self._executemany_chunked(conn, sql, self._json_safe_rows(values_list), chunk_size)
             except Exception as e:
                 logger.error(f"Batch SQL Error: {sql} | {e}")
                 raise
 
-    def update(self, df: pd.DataFrame, table_name: str):
+    @staticmethod
+    def _upsert_sql(meta: TableMeta, columns: List[str], conflict_cols: List[str] = None) -> str:
+        """按 (列集合, 冲突列) 缓存 INSERT ... ON CONFLICT 语句，语义与 SQLAlchemy on_conflict_do_update 一致"""
+        conflict_cols = list(conflict_cols or meta.conflict_cols)
+        key = (tuple(columns), tuple(conflict_cols))
+        sql = meta.raw_sql.get(key)
+        if sql is None:
+            update_cols = meta.non_conflict_cols if conflict_cols == meta.conflict_cols else \
+                [c.name for c in meta.table.columns if c.name not in conflict_cols and not c.primary_key]
+            quote = lambda names: ", ".join(f'"{n}"' for n in names)
+            action = ("DO UPDATE SET " + ", ".join(f'"{c}"=excluded."{c}"' for c in update_cols)) if update_cols else "DO NOTHING"
+            placeholders = ", ".join("?" * len(columns))
+            sql = (f'INSERT INTO "{meta.table.name}" ({quote(columns)}) VALUES ({placeholders}) '
+                   f'ON CONFLICT ({quote(conflict_cols)}) {action}')
+            meta.raw_sql[key] = sql
+        return sql
+
+    def upsert_raw(self, table_name: str, df: pd.DataFrame, conflict_cols: List[str] = None, chunk_size: int = BATCH_CHUNK_SIZE) -> int:
+        """原生 INSERT ... ON CONFLICT DO UPDATE，按位置元组分块 executemany，不经过 SQLAlchemy；
+        要求各列为基础类型（数值/字符串），conflict_cols 缺省取表的唯一约束列"""
+        if df is None or df.empty: return 0
+        meta = self._table_meta(table_name)
+        if meta is None or not (conflict_cols or meta.conflict_cols):
+            raise ValueError(f"{table_name}: 表不存在或缺少唯一约束，无法 upsert")
+        columns = [c.name for c in meta.table.columns if c.name in df.columns]
+        sql = self._upsert_sql(meta, columns, conflict_cols)
+        # 按位置生成元组并流式分块，不为每行构造 dict
+        rows = df[columns].itertuples(index=False, name=None)
+        with self._conn(write=True) as conn:
+            return self._executemany_chunked(conn, sql, rows, chunk_size)
+
+    def update(self, df: pd.DataFrame, table_name: str, chunk_size: int = BATCH_CHUNK_SIZE):
         if df is None or df.empty: return
-        table = self._get_table(table_name)
-        if table is None:
-            with self._lock, self.create_connection() as conn:
+        meta = self._table_meta(table_name)
+        if meta is None:
+            with self._conn(write=True) as conn:
                 df.to_sql(table_name, conn, if_exists='replace', index=False)
-                return
+            self._schema_version += 1
+            return
 
-        conflict_cols = []
-        for c in table.constraints:
-            if isinstance(c, UniqueConstraint):
-                conflict_cols = [col.name for col in c.columns]
-                break
+        if meta.conflict_cols:
+            columns = [c.name for c in meta.table.columns if c.name in df.columns]
+            if all(dtype.kind in "biufO" for dtype in df.dtypes[columns]):
+                self.upsert_raw(table_name, df, chunk_size=chunk_size)
+                return
 
-        if conflict_cols:
+            # 日期等需要类型适配的列，回退到 SQLAlchemy，仅为当前分块构造 dict
+            if self._in_tx:
+                raise RuntimeError(f"{table_name}: 事务内仅支持基础类型列的 upsert")
+            rows = df[columns].itertuples(index=False, name=None)
             with self.engine.begin() as conn:
-                rows = df.to_dict(orient="records")
-                stmt = insert(table)
-                update_cols = {c.name: stmt.excluded[c.name] for c in table.columns if c.name not in conflict_cols and not c.primary_key}
-                upsert_stmt = stmt.on_conflict_do_update(index_elements=conflict_cols, set_=update_cols) if update_cols else stmt.on_conflict_do_nothing(index_elements=conflict_cols)
-                conn.execute(upsert_stmt, rows)
+                while chunk := list(islice(rows, UPSERT_CHUNK_SIZE)):
+                    conn.execute(meta.upsert_stmt, [dict(zip(columns, r)) for r in chunk])
         else:
-            with self._lock, self.create_connection() as conn:
+            with self._conn(write=True) as conn:
                 df.to_sql(table_name, conn, if_exists='replace', index=False, method='multi')
+            self._schema_version += 1
 
 class QuantDB:
+    # 固定字段顺序与建表语句一致，保证 INSERT 语句只编译一次
+    STOCK_INFO_FIELDS = ("symbol", "status", "market_cap", "current_price", "fifty_two_week_high", "fifty_two_week_low", "all_time_high", "all_time_low",
+                         "short_ratio", "country", "industry", "sector", "quote_type", "recommendation", "info", "update_time")
+    STRATEGY_SIGNAL_FIELDS = ("symbol", "strategy_name", "strategy_class", "param_config", "perf", "equity_df")
+    _STOCK_INFO_SQL = f"INSERT OR REPLACE INTO stock_info ({','.join(STOCK_INFO_FIELDS)}) VALUES ({','.join(['?']*len(STOCK_INFO_FIELDS))})"
+    _STRATEGY_SIGNAL_SQL = f"INSERT OR REPLACE INTO strategy_signal ({','.join(STRATEGY_SIGNAL_FIELDS)}) VALUES ({','.join(['?']*len(STRATEGY_SIGNAL_FIELDS))})"
+
     def __init__(self, db_path="./data/quant_data.db"):
         self.db = DB(db_path)
 
@@ -143,9 +444,14 @@ class QuantDB:
             "CREATE TABLE IF NOT EXISTS analysis_report (symbol TEXT, date TEXT, three_filters_score double, three_filters_report TEXT, double_bottom_score double, double_bottom_report TEXT, double_top_score double, double_top_report TEXT, cup_handle_score double, cup_handle_report TEXT, update_time TEXT, UNIQUE(symbol, date))",
             "CREATE TABLE IF NOT EXISTS strategy_pool (id INTEGER PRIMARY KEY, strategy_name TEXT, strategy_class TEXT, param_configs TEXT, UNIQUE(strategy_class, param_configs))",
             "CREATE TABLE IF NOT EXISTS strategy_signal (symbol TEXT, strategy_name TEXT, strategy_class TEXT, param_config TEXT, perf TEXT, equity_df TEXT, UNIQUE(symbol, strategy_class))",
-            "CREATE TABLE IF NOT EXISTS strategy_report(symbol TEXT, report TEXT, UNIQUE(symbol))"
+            "CREATE TABLE IF NOT EXISTS strategy_report(symbol TEXT, report TEXT, UNIQUE(symbol))",
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, model TEXT, response TEXT, update_time TEXT)",
+            "CREATE INDEX IF NOT EXISTS ix_price_sid ON stock_price(symbol, interval, date)",
+            "CREATE INDEX IF NOT EXISTS ix_ar_date_score ON analysis_report(date, three_filters_score DESC)",
+            "CREATE INDEX IF NOT EXISTS ix_price_interval_date ON stock_price(interval, date)"
         ]
         self.db.ddl(table_ddl)
+        self.db.prime_table_cache()
 
     def tables(self)->List[str]:
         return self.db.tables()
@@ -153,14 +459,33 @@ class QuantDB:
     def query(self, sql)->pd.DataFrame:
         return self.db.query(sql)
 
+    @staticmethod
+    def _in_chunks(symbols: List[str]):
+        """去重后按 IN_CHUNK_SIZE 分组，产出 (分组, 占位符串)"""
+        symbols = list(dict.fromkeys(symbols))
+        for i in range(0, len(symbols), IN_CHUNK_SIZE):
+            chunk = symbols[i:i + IN_CHUNK_SIZE]
+            yield chunk, ",".join(["?"] * len(chunk))
+
     def refresh_stock_base(self, df, exchange: str = None):
         if isinstance(df, pd.DataFrame) and not df.empty:
             table_name = "stock_base"
             sql = f"DELETE FROM {table_name}"
             params = (exchange,) if exchange else ()
             if exchange: sql += " WHERE exchange = ?"
-            self.db.update_sql(sql, params)
-            self.db.update(df, table_name)
+            # 删除与写入在同一事务内完成，避免中途出现空表
+            with self.db.transaction():
+                self.db.update_sql(sql, params)
+                self.db.update(df, table_name)
+            self.maintain()
+
+    def maintain(self):
+        rows = self.db.update_sql_params("DELETE FROM llm_cache WHERE update_time < datetime('now', 'localtime', ?)", (f"-{LLM_CACHE_TTL_DAYS} days",))
+        if rows: logger.info(f"Pruned {rows} expired llm_cache rows")
+        self.db.maintain()
+
+    def close(self):
+        self.db.close()
 
     def update_stock_status(self, symbol: str, status: str):
         self.db.update_sql("UPDATE stock_base SET status = ? WHERE symbol = ?", (status, symbol))
@@ -171,80 +496,136 @@ class QuantDB:
         if exchange:
             sql += " AND a.exchange = ?"; params.append(exchange)
         sql += " ORDER BY CAST(b.market_cap AS FLOAT) DESC, a.mkt_cap DESC"
-        if top_k: sql += f" LIMIT {int(top_k)}"
-        df = self.db.query(sql, tuple(params))
+        if top_k: sql += " LIMIT ?"; params.append(int(top_k))
+        columns, rows = self.db.query_rows(sql, tuple(params))
+        df = pd.DataFrame(rows, columns=columns)
         if not df.empty and "market_cap" in df.columns:
-            df["market_cap"] = df["market_cap"].apply(lambda x: f"{float(x):.0f}" if pd.notnull(x) else "0")
+            mc = pd.to_numeric(df["market_cap"], errors="coerce")
+            df["market_cap"] = np.where(mc.notnull(), mc.fillna(0).round(0).astype("int64").astype(str), "0")
         return df
 
     def update_stock_info(self, keyvalues: Dict[str, Any]) -> int:
-        keys = keyvalues.keys()
-        sql = f"INSERT OR REPLACE INTO stock_info ({','.join(keys)}) VALUES ({','.join(['?']*len(keys))})"
-        return self.db.update_sql_params(sql, tuple(keyvalues.values()))
+        values = tuple(keyvalues.get(k) for k in self.STOCK_INFO_FIELDS)
+        return self.db.update_sql_params(self._STOCK_INFO_SQL, values)
 
     def update_stock_info_batch(self, records: List[dict]) -> int:
         if not records: return 0
-        keys = list(records[0].keys())
-        sql = f"INSERT OR REPLACE INTO stock_info ({','.join(keys)}) VALUES ({','.join(['?']*len(keys))})"
-        values_list = [tuple(r[k] for k in keys) for r in records]
+        # 按首条记录实际携带的字段取值（缺失列由 INSERT 置为 NULL），itemgetter 在 C 层组装元组
+        fields = tuple(k for k in self.STOCK_INFO_FIELDS if k in records[0])
+        if fields == self.STOCK_INFO_FIELDS:
+            sql = self._STOCK_INFO_SQL
+        else:
+            sql = f"INSERT OR REPLACE INTO stock_info ({','.join(fields)}) VALUES ({','.join(['?']*len(fields))})"
+        getter = operator.itemgetter(*fields)
+        values_list = list(map(getter, records)) if len(fields) > 1 else [(getter(r),) for r in records]
         return self.db.update_sql_params_many(sql, values_list)
 
     def query_stock_info(self, symbol: str):
         sql = "SELECT a.*, b.name FROM stock_info a LEFT JOIN stock_base b ON a.symbol = b.symbol WHERE a.symbol = ?"
         return self.db.query(sql, (symbol,))
 
+    PRICE_NUMCOLS = ("open", "high", "low", "close", "amount")
+
     def update_stock_price(self, df):
         if isinstance(df, pd.DataFrame) and not df.empty:
-            self.db.update(df.round(2), "stock_price")
+            # 只对价格列取整，不扫描 symbol/interval 等文本列
+            rounded = {c: np.round(df[c].to_numpy(dtype=float), 2) for c in self.PRICE_NUMCOLS if c in df.columns}
+            self.db.upsert_raw("stock_price", df.assign(**rounded), ["symbol", "date", "interval"])
+
+    PRICE_INFO_FIELDS = ("current_price", "fifty_two_week_high", "fifty_two_week_low", "short_ratio", "country", "industry", "sector", "recommendation")
+
+    def _broadcast_stock_info(self, df: pd.DataFrame) -> pd.DataFrame:
+        """按 symbol 单独查询 stock_info 后在 pandas 中合并，避免 JOIN 在每行价格上重复维度列"""
+        sql = f"SELECT symbol, {', '.join(self.PRICE_INFO_FIELDS)} FROM stock_info WHERE symbol IN "
+        # 与价格查询一样按 IN_CHUNK_SIZE 分组，避免超出 SQLite 绑定参数上限
+        infos = [self.db.query(sql + f"({marks})", tuple(chunk)) for chunk, marks in self._in_chunks(df["symbol"].unique().tolist())]
+        info = pd.concat(infos, ignore_index=True) if len(infos) > 1 else infos[0]
+        if info.empty:
+            for c in self.PRICE_INFO_FIELDS: df[c] = None
+            return df
+        return df.merge(info, on="symbol", how="left")
 
     def query_stock_price(self, symbol: str, interval: str = 'daily', date: str = None, top_k: int = None, start_date: str = None, end_date: str = None):
-        sql = """SELECT a.*, b.current_price, b.fifty_two_week_high, b.fifty_two_week_low, b.short_ratio, b.country, b.industry, b.sector, b.recommendation 
-                 FROM stock_price a LEFT JOIN stock_info b ON a.symbol = b.symbol WHERE 1=1"""
+        sql = "SELECT a.* FROM stock_price a WHERE 1=1"
         params = []
         if symbol: sql += " AND a.symbol = ?"; params.append(symbol)
         if interval: sql += " AND a.interval = ?"; params.append(interval)
-        if date: sql += " AND SUBSTR(a.date, 1, 10) <= ?"; params.append(date)
-        if start_date: sql += " AND SUBSTR(a.date, 1, 10) >= ?"; params.append(start_date)
-        if end_date: sql += " AND SUBSTR(a.date, 1, 10) <= ?"; params.append(end_date)
-        sql += " ORDER BY a.date DESC"
-        if top_k: sql += f" LIMIT {int(top_k)}"
+        # date 为 "YYYY-MM-DD[ HH:MM:SS]"，直接比较列值以命中 (symbol, interval, date) 索引；'~' 大于日期中的任意字符
+        if date: sql += " AND a.date < SUBSTR(?, 1, 10) || '~'"; params.append(date)
+        if start_date: sql += " AND a.date >= SUBSTR(?, 1, 10)"; params.append(start_date)
+        if end_date: sql += " AND a.date < SUBSTR(?, 1, 10) || '~'"; params.append(end_date)
+        # 结果统一按日期升序返回：取最近 top_k 条时先倒序截取再在子查询外正序，均由索引完成排序
+        if top_k: sql = f"SELECT * FROM ({sql} ORDER BY a.date DESC LIMIT ?) ORDER BY date ASC"; params.append(int(top_k))
+        else: sql += " ORDER BY a.date ASC"
         df = self.db.query(sql, tuple(params))
         if df.empty: return df
-        df = df.sort_values(by="date", ascending=True).reset_index(drop=True)
+        return self._finish_price_frame(self._broadcast_stock_info(df), interval)
+
+    def query_stock_price_many(self, symbols: List[str], interval: str = 'daily', start_date: str = None, end_date: str = None) -> Dict[str, pd.DataFrame]:
+        """批量查询多个 symbol 的行情，按 IN (...) 分组查询后在内存中按 symbol 拆分"""
+        dfs = []
+        for chunk, marks in self._in_chunks(symbols):
+            sql = f"SELECT a.* FROM stock_price a WHERE a.symbol IN ({marks})"
+            params = list(chunk)
+            if interval: sql += " AND a.interval = ?"; params.append(interval)
+            if start_date: sql += " AND a.date >= SUBSTR(?, 1, 10)"; params.append(start_date)
+            if end_date: sql += " AND a.date < SUBSTR(?, 1, 10) || '~'"; params.append(end_date)
+            sql += " ORDER BY a.symbol, a.date ASC"
+            dfs.append(self.db.query(sql, tuple(params)))
+        df = pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+        groups = {} if df.empty else dict(tuple(self._broadcast_stock_info(df).groupby("symbol", sort=False)))
+        # 无数据的 symbol 返回保留价格与基本信息列的空表，与 query_stock_price 一样可直接按列选取
+        empty = lambda: self._finish_price_frame(df.iloc[:0].assign(**{c: None for c in self.PRICE_INFO_FIELDS if c not in df.columns}), interval)
+        return {s: self._finish_price_frame(groups[s], interval) if s in groups else empty() for s in symbols}
+
+    def _finish_price_frame(self, df: pd.DataFrame, interval: str) -> pd.DataFrame:
+        """查询结果已按日期升序，这里只做索引重置、日期格式化与价格取整"""
+        df = df.reset_index(drop=True)
         if interval in DAY_INTERVAL:
-            df["date"] = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d")
+            df["date"] = _day_str(df["date"])
         if "id" in df.columns: df.drop(columns=['id'], inplace=True)
-        return df.round(2)
+        float_cols = [c for c, dtype in df.dtypes.items() if dtype.kind == "f"]
+        if float_cols: df[float_cols] = np.round(df[float_cols].to_numpy(), 2)
+        return df
 
-    def latest_stock_price(self, symbol: str, interval: str) -> pd.DataFrame:
+    def latest_stock_price(self, symbol: str, interval: str) -> Optional[Tuple]:
+        """返回最新一行 (date,)，无数据时返回 None"""
         sql = "SELECT date FROM stock_price WHERE symbol = ? AND interval = ? ORDER BY date DESC LIMIT 1"
-        return self.db.query(sql, (symbol, interval))
+        _, rows = self.db.query_rows(sql, (symbol, interval))
+        return rows[0] if rows else None
 
     def query_analysis_report(self, symbol: str, date: str = None, top_k: int = 20, start_date: str = None, end_date: str = None, score_only: bool = True) -> pd.DataFrame:
         fields = "a.symbol, a.date, b.open, b.high, b.low, b.close, b.volume, three_filters_score, double_bottom_score, double_top_score, cup_handle_score, update_time" if score_only else "a.*, b.open, b.high, b.low, b.close, b.volume"
-        sql = f"SELECT {fields} FROM analysis_report a LEFT JOIN stock_price b ON a.symbol = b.symbol WHERE a.symbol = ? AND a.date = SUBSTR(b.date, 1, 10) AND b.interval = 'daily'"
+        # 以日期区间关联价格表（等价于 SUBSTR(b.date, 1, 10) = a.date），可走 ix_price_sid 索引
+        sql = f"SELECT {fields} FROM analysis_report a JOIN stock_price b ON b.symbol = a.symbol AND b.interval = 'daily' AND b.date >= a.date AND b.date < a.date || '~' WHERE a.symbol = ?"
         params = [symbol]
         if date: sql += " AND a.date = ?"; params.append(date)
         if start_date: sql += " AND a.date >= ?"; params.append(start_date)
         if end_date: sql += " AND a.date <= ?"; params.append(end_date)
         sql += " ORDER BY a.date DESC"
-        if (not start_date and not end_date) and top_k: sql += f" LIMIT {int(top_k)}"
+        if (not start_date and not end_date) and top_k: sql += " LIMIT ?"; params.append(int(top_k))
         df = self.db.query(sql, tuple(params))
-        if not df.empty: df['date'] = pd.to_datetime(df['date'], errors='coerce').dt.strftime('%Y-%m-%d')
+        if not df.empty: df['date'] = _day_str(df['date'], errors='coerce')
         return df
 
+    def query_reported_dates(self, symbol: str, start_date: str, end_date: str) -> set:
+        """区间内已有分析报告（且有当日日线）的日期集合，与逐日 query_analysis_report(date=...) 判重一致，一次查询完成"""
+        sql = "SELECT a.date FROM analysis_report a WHERE a.symbol = ? AND a.date >= ? AND a.date <= ? AND EXISTS (SELECT 1 FROM stock_price b WHERE b.symbol = a.symbol AND b.interval = 'daily' AND b.date >= a.date AND b.date < a.date || '~')"
+        _, rows = self.db.query_rows(sql, (symbol, start_date, end_date))
+        return {row[0] for row in rows}
+
     def fetch_analysis_report(self, start_date: str, end_date: str) -> pd.DataFrame:
         sql = "SELECT symbol, date, three_filters_score as score FROM analysis_report WHERE date >= ? AND date <= ? ORDER BY date ASC, three_filters_score DESC"
         df = self.db.query(sql, (start_date, end_date))
-        if not df.empty: df['date'] = pd.to_datetime(df['date'], errors='coerce').dt.strftime('%Y-%m-%d')
+        if not df.empty: df['date'] = _day_str(df['date'], errors='coerce')
         return df
 
     def update_analysis_report(self, df: pd.DataFrame):
         if isinstance(df, pd.DataFrame) and not df.empty:
-            self.db.update(df, "analysis_report")
+            self.db.upsert_raw("analysis_report", df, ["symbol", "date"])
 
     def fetch_strategy_pool(self) -> pd.DataFrame:
-        return self.db.query("SELECT id, strategy_name, strategy_class, param_configs FROM strategy_pool ORDER BY id ASC")
+        return self.db.query_fast("SELECT id, strategy_name, strategy_class, param_configs FROM strategy_pool ORDER BY id ASC")
 
     def add_strategy_pool(self, strategy_name: str, strategy_class: str, param_configs: str) -> int:
         sql = "INSERT INTO strategy_pool (strategy_name, strategy_class, param_configs) VALUES (?, ?, ?)"
@@ -253,46 +634,95 @@ class QuantDB:
     def del_strategy_pool(self, id: int) -> int:
         return self.db.update_sql("DELETE FROM strategy_pool WHERE id = ?", (id,)) 
 
-    def fetch_strategy_signal(self, symbol: str):
-        sql = "SELECT a.symbol, a.strategy_name, a.strategy_class, param_config, perf, equity_df FROM strategy_signal a, strategy_pool b on a.strategy_class = b.strategy_class WHERE a.symbol = ?"
-        df = self.db.query(sql, (symbol,))
-        results = []
-        for _, row in df.iterrows():
+    @staticmethod
+    def _equity_records(raw: Union[bytes, str]) -> List[Dict[str, Any]]:
+        """解析 equity_df：新格式为已清洗的记录列表（BLOB 或文本），直接返回；兼容旧的 orient='split' 结构"""
+        obj = _loads(raw)
+        if isinstance(obj, list): return obj
+        columns, data = ["index", *obj["columns"]], obj["data"]
+        index = obj.get("index") or range(len(data))
+        return [dict(zip(columns, (0 if v is None else v for v in (i, *row)))) for i, row in zip(index, data)]
+
+    _SIGNAL_SQL = "SELECT a.symbol, a.strategy_name, a.strategy_class, param_config, perf, equity_df FROM strategy_signal a, strategy_pool b on a.strategy_class = b.strategy_class WHERE "
+
+    def _parse_signals(self, rows) -> Dict[str, List[Dict[str, Any]]]:
+        results = {}
+        for sym, strategy_name, strategy_class, param_config, perf, equity_df in rows:
             try:
-                results.append({
-                    "symbol": row["symbol"], "strategy_name": row["strategy_name"], "strategy_class": row["strategy_class"],
-                    "param_config": json.loads(row["param_config"]), "perf": json.loads(row["perf"]),
-                    "equity_df": pd.read_json(io.StringIO(row["equity_df"]), orient='split').replace([np.inf, -np.inf], np.nan).fillna(0).reset_index().to_dict(orient='records')
+                results.setdefault(sym, []).append({
+                    "symbol": sym, "strategy_name": strategy_name, "strategy_class": strategy_class,
+                    "param_config": _loads(param_config), "perf": _loads(perf),
+                    "equity_df": self._equity_records(equity_df)
                 })
             except Exception as e:
-                logger.error(f"Error parsing strategy signal for {symbol}: {e}")
+                logger.error(f"Error parsing strategy signal for {sym}: {e}")
         return results
 
+    def fetch_strategy_signal(self, symbol: str):
+        _, rows = self.db.query_rows(self._SIGNAL_SQL + "a.symbol = ?", (symbol,))
+        return self._parse_signals(rows).get(symbol, [])
+
+    def fetch_strategy_signal_many(self, symbols: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """批量获取多个 symbol 的策略信号：{symbol: [records]}"""
+        results = {s: [] for s in symbols}
+        for chunk, marks in self._in_chunks(symbols):
+            _, rows = self.db.query_rows(self._SIGNAL_SQL + f"a.symbol IN ({marks})", tuple(chunk))
+            results.update(self._parse_signals(rows))
+        return results
+
+    @staticmethod
+    def _equity_json(df: pd.DataFrame) -> bytes:
+        """按日期倒序写成 orjson 记录列表（含原 index），写入前即把 NaN/inf/空值置 0，读取时无需再处理；
+        以 UTF-8 字节直接存为 BLOB，读写两端都不做 str 编解码"""
+        if not df["date"].is_monotonic_decreasing:
+            df = df.sort_values(by='date', ascending=False)
+        columns = ["index", *df.columns]
+        values = [df.index.tolist()]
+        for c in df.columns:
+            arr = df[c].to_numpy()
+            values.append(np.where(np.isfinite(arr), arr, 0.0).tolist() if arr.dtype.kind == "f" else arr.tolist())
+        records = [dict(zip(columns, (0 if v is None or v != v else v for v in row))) for row in zip(*values)]
+        return orjson.dumps(records, default=str, option=orjson.OPT_SERIALIZE_NUMPY)
+
     def update_strategy_signal(self, keyvalues) -> int:
         if isinstance(keyvalues, dict): keyvalues = list(keyvalues.values()) 
         if not keyvalues: return 0
-        fields = ['symbol', 'strategy_name', 'strategy_class', 'param_config', 'perf', 'equity_df']
-        batch_data = []
-        for kv in keyvalues:
-            row = kv.copy()
-            if isinstance(row.get("param_config"), dict): row["param_config"] = json.dumps(row["param_config"])
-            if isinstance(row.get("perf"), dict): row["perf"] = json.dumps(row["perf"])
-            if isinstance(row.get("equity_df"), pd.DataFrame): 
-                row["equity_df"] = row["equity_df"].sort_values(by='date', ascending=False).to_json(orient='split')
-            batch_data.append(tuple(row.get(f) for f in fields))
-        sql = f"INSERT OR REPLACE INTO strategy_signal ({','.join(fields)}) VALUES ({','.join(['?']*len(fields))})"
-        return self.db.update_sql_params_many(sql, batch_data)
+        as_json = lambda v: _dumps(v) if isinstance(v, dict) else v
+        param_configs = [as_json(kv.get("param_config")) for kv in keyvalues]
+        perfs = [as_json(kv.get("perf")) for kv in keyvalues]
+        equities = [self._equity_json(e) if isinstance(e := kv.get("equity_df"), pd.DataFrame) else e for kv in keyvalues]
+        # 键列缺失时与原实现一致写入 NULL
+        keys = [tuple(kv.get(f) for f in self.STRATEGY_SIGNAL_FIELDS[:3]) for kv in keyvalues]
+        batch_data = [(*k, c, p, e) for k, c, p, e in zip(keys, param_configs, perfs, equities)]
+        return self.db.update_sql_params_many(self._STRATEGY_SIGNAL_SQL, batch_data)
 
     def fetch_strategy_report(self, symbol: str):
         sql = "SELECT report FROM strategy_report WHERE symbol = ?"
         df = self.db.query(sql, (symbol,))
-        return json.loads(df['report'].iloc[-1]) if not df.empty else {}
+        return _loads(df['report'].iloc[-1]) if not df.empty else {}
+
+    def fetch_strategy_report_many(self, symbols: List[str]) -> Dict[str, Dict]:
+        """批量获取多个 symbol 的策略报告，缺失的 symbol 返回空 dict"""
+        results = {s: {} for s in symbols}
+        for chunk, marks in self._in_chunks(symbols):
+            _, rows = self.db.query_rows(f"SELECT symbol, report FROM strategy_report WHERE symbol IN ({marks})", tuple(chunk))
+            results.update({sym: _loads(report) for sym, report in rows})
+        return results
 
     def update_strategy_report(self, symbol: str, report: dict) -> int:
-        report_str = json.dumps(report, ensure_ascii=False)
+        report_str = _dumps(report)
         sql = "INSERT OR REPLACE INTO strategy_report(symbol, report) VALUES (?, ?)"
         return self.db.update_sql_params(sql, (symbol, report_str))
 
+    def fetch_llm_cache(self, key: str) -> Optional[str]:
+        sql = "SELECT response FROM llm_cache WHERE key = ? AND update_time >= datetime('now', 'localtime', ?)"
+        _, rows = self.db.query_rows(sql, (key, f"-{LLM_CACHE_TTL_DAYS} days"))
+        return rows[0][0] if rows else None
+
+    def update_llm_cache(self, key: str, model: str, response: str) -> int:
+        sql = "INSERT OR REPLACE INTO llm_cache (key, model, response, update_time) VALUES (?, ?, ?, datetime('now', 'localtime'))"
+        return self.db.update_sql_params(sql, (key, model, response))
+
 class TradeDB:
     def __init__(self, db_path="./data/quant_trade.db"):
         self.db = DB(db_path)
@@ -305,6 +735,7 @@ class TradeDB:
             'CREATE TABLE IF NOT EXISTS order_history (order_id TEXT PRIMARY KEY, status TEXT)'
         ]
         self.db.ddl(ddls)
+        self.db.prime_table_cache()
     
     def tables(self)->List[str]:
         return self.db.tables()
@@ -313,38 +744,40 @@ class TradeDB:
         return self.db.query(sql)
 
     def get_balance(self) -> float:
-        df = self.db.query("SELECT balance FROM account WHERE id = 1")
-        if df.empty:
+        _, rows = self.db.query_rows("SELECT balance FROM account WHERE id = 1")
+        if not rows:
             initial = getattr(TradeConfig, 'QUANT_INITIAL_CASH', 50000.0)
             self.db.update_sql("INSERT INTO account (id, balance) VALUES (1, ?)", (initial,))
             return initial
-        return float(df.iloc[0]['balance'])
+        return float(rows[0][0])
 
     def record_trade(self, order_id, symbol, side, qty, price):
-        if not self.db.query("SELECT 1 FROM order_history WHERE order_id = ?", (order_id,)).empty: return False
         try:
-            side = side.upper()
-            impact = -(qty * price) if side == 'BUY' else (qty * price)
-            self.db.update_sql("UPDATE account SET balance = balance + ? WHERE id = 1", (impact,))
-            pos_df = self.db.query("SELECT qty, cost_price FROM positions WHERE symbol = ?", (symbol,))
-            if not pos_df.empty:
-                old_qty, old_cost = pos_df.iloc[0]['qty'], pos_df.iloc[0]['cost_price']
-                new_qty = old_qty + (qty if side == 'BUY' else -qty)
-                if new_qty <= 0: self.db.update_sql("DELETE FROM positions WHERE symbol = ?", (symbol,))
-                else:
-                    new_cost = (old_qty * old_cost + qty * price) / new_qty if side == 'BUY' else old_cost
-                    self.db.update_sql("UPDATE positions SET qty = ?, cost_price = ? WHERE symbol = ?", (new_qty, new_cost, symbol))
-            elif side == 'BUY':
-                self.db.update_sql("INSERT INTO positions VALUES (?, ?, ?)", (symbol, qty, price))
-            self.db.update_sql("INSERT INTO order_history VALUES (?, 'FILLED')", (order_id,))
+            # 查重、余额、持仓与订单记录在同一事务内完成，失败整体回滚
+            with self.db.transaction() as conn:
+                if conn.execute("SELECT 1 FROM order_history WHERE order_id = ?", (order_id,)).fetchone(): return False
+                side = side.upper()
+                impact = -(qty * price) if side == 'BUY' else (qty * price)
+                conn.execute("UPDATE account SET balance = balance + ? WHERE id = 1", (impact,))
+                pos = conn.execute("SELECT qty, cost_price FROM positions WHERE symbol = ?", (symbol,)).fetchone()
+                if pos is not None:
+                    old_qty, old_cost = pos
+                    new_qty = old_qty + (qty if side == 'BUY' else -qty)
+                    if new_qty <= 0: conn.execute("DELETE FROM positions WHERE symbol = ?", (symbol,))
+                    else:
+                        new_cost = (old_qty * old_cost + qty * price) / new_qty if side == 'BUY' else old_cost
+                        conn.execute("UPDATE positions SET qty = ?, cost_price = ? WHERE symbol = ?", (new_qty, new_cost, symbol))
+                elif side == 'BUY':
+                    conn.execute("INSERT INTO positions VALUES (?, ?, ?)", (symbol, qty, price))
+                conn.execute("INSERT INTO order_history VALUES (?, 'FILLED')", (order_id,))
             return True
         except Exception as e:
             logger.error(f"Trade Error: {e}")
             return False
 
     def get_positions(self):
-        df = self.db.query("SELECT * FROM positions")
-        return {r['symbol']: {'qty': r['qty'], 'cost': r['cost_price']} for _, r in df.iterrows()}
+        _, rows = self.db.query_rows("SELECT symbol, qty, cost_price FROM positions")
+        return {symbol: {'qty': qty, 'cost': cost_price} for symbol, qty, cost_price in rows}
 
 if __name__ == '__main__':
     #d = DB(db_path="./data/quant_data.db")
@@ -51,6 +51,7 @@ def main():
     def shutdown_handler(signum, frame):
         logger.info(f"Received signal {signum}, shutting down...")
         scheduler.shutdown()
+        db.close()
         sys.exit(0)
 
     # 捕获退出信号
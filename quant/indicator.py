@@ -1,4 +1,5 @@
 import talib
+import numpy as np
 import pandas as pd
 
 class IndicatorCalculator:
@@ -9,52 +10,79 @@ class IndicatorCalculator:
         'decimal_places': 2
     }
 
+    @staticmethod
+    def _sort_by_date(df: pd.DataFrame) -> pd.DataFrame:
+        """按日期升序并重置索引；输入已有序且为默认索引时只做浅拷贝，避免排序与整表复制"""
+        if df["date"].is_monotonic_increasing:
+            return df.copy(deep=False) if df.index.equals(pd.RangeIndex(len(df))) else df.reset_index(drop=True)
+        return df.sort_values(by="date", ascending=True).reset_index(drop=True)
+
+    @staticmethod
+    def _assign_rounded(df: pd.DataFrame, indicators: dict, decimals: int) -> pd.DataFrame:
+        """只对新增指标数组原地取整后写入，OHLCV 等原有列由上游取整，避免 df.round 整表复制"""
+        for col, values in indicators.items():
+            df[col] = np.round(values, decimals, out=values)
+        return df
+
     @classmethod
     def calc_ema_macd(cls, df: pd.DataFrame, **kwargs) -> pd.DataFrame:
         """基础计算：处理排序、校验并计算 EMA 和 MACD"""
         p = {**cls.DEFAULTS, **kwargs}
+        cls._check_columns(df)
+        return cls._ema_macd(cls._sort_by_date(df), p)
+
+    @staticmethod
+    def _check_columns(df: pd.DataFrame):
         required = ['date', 'close']
-        if any(col not in df.columns for col in required):
+        if not set(required).issubset(df.columns):
             raise ValueError(f"Missing columns: {required}")
-        df = df.sort_values(by="date", ascending=True).reset_index(drop=True) 
-        
-        # ema_short, ema_long, macd, signal, hist
-        df["ema_short"] = talib.EMA(df["close"], p['ema_short'])
-        df["ema_long"] = talib.EMA(df["close"], p['ema_long'])
-        df["macd"], df["signal"], df["hist"] = talib.MACD(
-            df["close"], p['ema_short'], p['ema_long'], p['macd_signal']
+
+    @classmethod
+    def _ema_macd(cls, df: pd.DataFrame, p: dict) -> pd.DataFrame:
+        """EMA/MACD 计算核心：调用方已完成列校验与排序"""
+        # ema_short, ema_long, macd, signal, hist：直接传入连续 float64 数组，绕过 talib 的 pandas 包装
+        close = np.ascontiguousarray(df["close"].to_numpy(dtype=np.float64))
+        ema_short = talib.EMA(close, p['ema_short'])
+        ema_long = talib.EMA(close, p['ema_long'])
+        macd, signal, hist = talib.MACD(
+            close, p['ema_short'], p['ema_long'], p['macd_signal']
         )
-        return df.round(p['decimal_places'])
+        indicators = {"ema_short": ema_short, "ema_long": ema_long, "macd": macd, "signal": signal, "hist": hist}
+        return cls._assign_rounded(df, indicators, p['decimal_places'])
 
     @classmethod
     def calc_ema_macd_kdj_boll(cls, df: pd.DataFrame, **kwargs) -> pd.DataFrame:
         """扩展计算：复用 EMA/MACD 结果并追加其他指标"""
         p = {**cls.DEFAULTS, **kwargs}
-        # 1. 校验需要的列
+        # 1. 校验需要的列，排序只做一次
         if not {'high', 'low', 'date'}.issubset(df.columns):
             raise ValueError("High/Low columns required for KDJ/ATR/BOLL")
-        df = df.sort_values(by="date", ascending=True).reset_index(drop=True)
+        cls._check_columns(df)
+        df = cls._sort_by_date(df)
 
         # 2. EMA, MACD
-        df = cls.calc_ema_macd(df, **p)
+        df = cls._ema_macd(df, p)
         
-        close, high, low = df["close"], df["high"], df["low"]
+        close, high, low = (np.ascontiguousarray(df[c].to_numpy(dtype=np.float64)) for c in ("close", "high", "low"))
         
         # 3. RSI, ATR
-        df["rsi"] = talib.RSI(close, p['rsi_period'])
-        df["atr"] = talib.ATR(high, low, close, p['atr_period'])
+        rsi = talib.RSI(close, p['rsi_period'])
+        atr = talib.ATR(high, low, close, p['atr_period'])
         
-        # KDJ
-        df["kdj_k"], df["kdj_d"] = talib.STOCH(
+        # KDJ：J = 3K - 2D，原地计算只分配一个临时数组
+        kdj_k, kdj_d = talib.STOCH(
             high, low, close, 
             fastk_period=p['kdj_period'], slowk_period=3, slowd_period=3
         )
-        df["kdj_j"] = 3 * df["kdj_k"] - 2 * df["kdj_d"]
+        kdj_j = 3 * kdj_k
+        kdj_j -= 2 * kdj_d
 
         # Bollinger
-        df["bb_upper"], df["bb_mid"], df["bb_lower"] = talib.BBANDS(
+        bb_upper, bb_mid, bb_lower = talib.BBANDS(
             close, timeperiod=p['bb_period'], nbdevup=2, nbdevdn=2
         )
 
-        return df.round(p['decimal_places'])
+        indicators = {"rsi": rsi, "atr": atr, "kdj_k": kdj_k, "kdj_d": kdj_d, "kdj_j": kdj_j,
+                      "bb_upper": bb_upper, "bb_mid": bb_mid, "bb_lower": bb_lower}
+        return cls._assign_rounded(df, indicators, p['decimal_places'])
 
@@ -1,10 +1,32 @@
-import openai
 import ollama
 import asyncio
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
 from openai import OpenAI, AsyncOpenAI
+from typing import Optional
 from abc import ABC, abstractmethod
 from config import OpenAI_CONFIG, OLLAMA_CONFIG, MODELSCOPE_CONFIG
 
+# 按客户端类型与 (api_key, base_url) 复用客户端：同一服务的多个 LLMClient 实例共享 httpx 连接池与 keep-alive 连接
+_CLIENTS = {}
+
+def _shared_client(cls, api_key:str, base_url:str, default_headers:dict=None):
+    key = (cls, api_key, base_url, tuple(sorted((default_headers or {}).items())))
+    if key not in _CLIENTS:
+        _CLIENTS[key] = cls(api_key=api_key, base_url=base_url, default_headers=default_headers)
+    return _CLIENTS[key]
+
+# ollama.chat 走模块级共享的同步 Client；异步 Client 的连接绑定事件循环，按循环各复用一个
+_OLLAMA_ASYNC_CLIENTS = weakref.WeakKeyDictionary()
+
+def _ollama_async_client() -> ollama.AsyncClient:
+    loop = asyncio.get_running_loop()
+    if loop not in _OLLAMA_ASYNC_CLIENTS:
+        _OLLAMA_ASYNC_CLIENTS[loop] = ollama.AsyncClient()
+    return _OLLAMA_ASYNC_CLIENTS[loop]
+
 class LLMClient(ABC):
     def __init__(self, temperature:float = 0):
         self.temperature = temperature
@@ -38,14 +60,10 @@ class ModelScopeClinet(LLMClient):
         ):
         super().__init__(temperature)
         self.model = model or MODELSCOPE_CONFIG["model"]
-        self.client = OpenAI(
-            api_key = api_key or MODELSCOPE_CONFIG["api_key"],
-            base_url = base_url or MODELSCOPE_CONFIG["base_url"],
-        )       
-        self.async_client = AsyncOpenAI(
-            api_key = api_key or MODELSCOPE_CONFIG["api_key"],
-            base_url = base_url or MODELSCOPE_CONFIG["base_url"],
-        )
+        api_key = api_key or MODELSCOPE_CONFIG["api_key"]
+        base_url = base_url or MODELSCOPE_CONFIG["base_url"]
+        self.client = _shared_client(OpenAI, api_key, base_url)
+        self.async_client = _shared_client(AsyncOpenAI, api_key, base_url)
          
     def chat(
             self, 
@@ -138,7 +156,7 @@ class OllamaClient(LLMClient):
             top_p: float = 0,
         ) -> str:
         try:
-            response = await ollama.AsyncClient().chat(
+            response = await _ollama_async_client().chat(
                 model=self.model,
                 messages=[
                     {
@@ -167,13 +185,11 @@ class OpenAIClient(LLMClient):
         ):
         super().__init__(temperature)
         self.model = model or OpenAI_CONFIG["model"]
-        openai.api_key = api_key or OpenAI_CONFIG["api_key"]
-        openai.base_url = base_url or OpenAI_CONFIG["base_url"]
-        openai.default_headers = default_headers or {"x-foo": "true"}
-        self.async_client = AsyncOpenAI(
-            api_key=api_key or OpenAI_CONFIG["api_key"], 
-            base_url=base_url or OpenAI_CONFIG["base_url"]
-        )
+        api_key = api_key or OpenAI_CONFIG["api_key"]
+        base_url = base_url or OpenAI_CONFIG["base_url"]
+        # 绑定实例级客户端，不再改写 openai 模块级全局配置
+        self.client = _shared_client(OpenAI, api_key, base_url, default_headers or {"x-foo": "true"})
+        self.async_client = _shared_client(AsyncOpenAI, api_key, base_url)
 
     def chat(
             self, 
@@ -183,7 +199,7 @@ class OpenAIClient(LLMClient):
             top_p: float = 0,
         ) -> str:
         try:
-            completion = openai.chat.completions.create(
+            completion = self.client.chat.completions.create(
                 model=self.model,
                 temperature=temperature or self.temperature,
                 messages=[
@@ -221,6 +237,71 @@ class OpenAIClient(LLMClient):
         except Exception as e:
             raise RuntimeError(f"OpenAI async chat failed: {e}") from e
 
+class CachedLLMClient(LLMClient):
+    """LLM 响应缓存：temperature 为 0 时输出可视为确定，按 (model, 参数, prompt) 摘要缓存；
+    进程内 LRU + 可选的 QuantDB.llm_cache 持久化，temperature > 0 时直接透传；refresh=True 时跳过读缓存并以新结果覆盖"""
+    def __init__(self, client:LLMClient, db=None, maxsize:int=256):
+        super().__init__(client.temperature)
+        self.client, self.db, self.maxsize = client, db, maxsize
+        self.model = getattr(client, "model", type(client).__name__)
+        self._memo, self._lock = OrderedDict(), threading.Lock()
+
+    def _key(self, prompt:str, max_tokens:int, temperature:float, top_p:float) -> Optional[str]:
+        t = temperature or self.temperature
+        if t: return None
+        raw = f"{self.model}\0{t}\0{max_tokens}\0{top_p}\0{prompt}"
+        return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+    def _get(self, key:str) -> Optional[str]:
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key]
+        response = self.db.fetch_llm_cache(key) if self.db is not None else None
+        if response is not None: self._remember(key, response)
+        return response
+
+    def _remember(self, key:str, response:str):
+        with self._lock:
+            self._memo[key] = response
+            if len(self._memo) > self.maxsize: self._memo.popitem(last=False)
+
+    def _put(self, key:str, response:str):
+        self._remember(key, response)
+        if self.db is not None: self.db.update_llm_cache(key, self.model, response)
+
+    def chat(
+            self, 
+            prompt:str,
+            max_tokens: int = 8192,
+            temperature: float = None,
+            top_p: float = 0,
+            refresh: bool = False,
+        ) -> str:
+        key = self._key(prompt, max_tokens, temperature, top_p)
+        if key is None: return self.client.chat(prompt, max_tokens, temperature, top_p)
+        response = None if refresh else self._get(key)
+        if response is None:
+            response = self.client.chat(prompt, max_tokens, temperature, top_p)
+            self._put(key, response)
+        return response
+
+    async def achat(
+            self,
+            prompt:str,
+            max_tokens: int = 8192,
+            temperature: float = None,
+            top_p: float = 0,
+            refresh: bool = False,
+        ) -> str:
+        key = self._key(prompt, max_tokens, temperature, top_p)
+        if key is None: return await self.client.achat(prompt, max_tokens, temperature, top_p)
+        response = None if refresh else self._get(key)
+        if response is None:
+            response = await self.client.achat(prompt, max_tokens, temperature, top_p)
+            self._put(key, response)
+        return response
+
 if __name__=="__main__":
     async def main():
         client = OpenAIClient(temperature=0.7)
@@ -237,4 +318,10 @@ if __name__=="__main__":
         for r in results:
             print(r)
 
+    # uvloop 可选：已安装时替换默认事件循环，降低大量并发请求的调度开销
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(main())
@@ -1,8 +1,13 @@
 import re
 import json
-import talib
+import orjson
+import asyncio
+import threading
+import numpy as np
 import pandas as pd
-from typing import Type, Dict, Any
+from typing import Type, Dict, Any, List, Tuple, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from db import QuantDB
 from utils.time import *
@@ -10,9 +15,15 @@ from utils.logger import logger
 from utils.checkpoint import Checkpoint
 from config import CRITICAL_STOCKS_US
 from quant.indicator import IndicatorCalculator
-from quant.llm import LLMClient
+from quant.llm import LLMClient, CachedLLMClient
 from core.ohlc import OHLCData
 
+# 指标结果缓存：按 (symbol, 末行日期, 行数, 收盘价) 复用，容量有限，按最近使用淘汰
+INDICATOR_CACHE_SIZE = 64
+_INDICATOR_CACHE = OrderedDict()
+_INDICATOR_LOCK = threading.Lock()
+_SCORE_RE = re.compile(r"<score>([-+]?\d*\.?\d+)</score>")
+
 class PriceDataInvalidError(Exception):
     def __init__(self, 
             symbol:str,
@@ -27,6 +38,7 @@ class PriceDataInvalidError(Exception):
 # =====================
 class Strategy:
     name: str = "base"
+    NO_PATTERN_REPORT: str = "未检测到形态，跳过 LLM 分析。<score>0.0</score>"
 
     def __init__(self, llm:LLMClient, db:QuantDB=QuantDB()):
         self.llm = llm
@@ -43,39 +55,104 @@ class Strategy:
         ) -> Dict[str, Any]:
         raise NotImplementedError
 
+    def _records(self, df: pd.DataFrame, n: int) -> List[Dict[str, Any]]:
+        """末尾 n 行转为记录列表，与 to_dict(orient="records") 输出一致；
+        object ndarray 的 tolist 直接得到 Python 标量，省去 pandas 逐行装箱"""
+        rows = df.tail(n)[self.columns].to_numpy(dtype=object).tolist()
+        return [dict(zip(self.columns, row)) for row in rows]
+
     def build_prompt(self, analysis: Dict[str, Any]) -> str:
         raise NotImplementedError
 
-    def quant(self, 
+    def should_invoke_llm(self, analysis: Dict[str, Any]) -> bool:
+        """是否需要调用 LLM；形态类策略在形态不成立时直接给 0 分"""
+        return True
+
+    def _chat_kwargs(self, refresh: bool) -> Dict[str, Any]:
+        """refresh（强制重算）时让带缓存的 LLM 客户端跳过读缓存"""
+        return {"refresh": True} if refresh and isinstance(self.llm, CachedLLMClient) else {}
+
+    @staticmethod
+    def _with_indicators(symbol: str, df_day: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """周线聚合并计算日/周指标；同一行情快照（末行日期、行数、收盘价）的结果在多个策略间复用，命中时跳过周线聚合"""
+        key = (symbol, df_day['date'].iat[-1], len(df_day), float(df_day['close'].iat[-1]))
+        with _INDICATOR_LOCK:
+            cached = _INDICATOR_CACHE.get(key)
+            if cached is not None: _INDICATOR_CACHE.move_to_end(key)
+        if cached is None:
+            cached = (
+                IndicatorCalculator.calc_ema_macd_kdj_boll(df_day),
+                Strategy._week_indicators(OHLCData(df_day).daily_week()),
+            )
+            with _INDICATOR_LOCK:
+                _INDICATOR_CACHE[key] = cached
+                if len(_INDICATOR_CACHE) > INDICATOR_CACHE_SIZE: _INDICATOR_CACHE.popitem(last=False)
+        return tuple(df.copy(deep=False) for df in cached)
+
+    @staticmethod
+    def _week_indicators(df_week: pd.DataFrame) -> pd.DataFrame:
+        return IndicatorCalculator.calc_ema_macd_kdj_boll(
+            df_week, 
+            ema_short=6, 
+            ema_long=13, 
+            macd_signal=4
+        )
+
+    def load_history(self, 
             symbol: str, 
+            days: int, 
             day_peroid: int=400, 
-            week_peroid: int=50,
             date: str=None
-        ) -> str:
-        # 1. 获取股票价格数据
+        ) -> pd.DataFrame:
+        """一次取出回溯 days 天所需的全部日线并计算日线指标，供 load_context(history=...) 按日期截取"""
         df_day = self.db.query_stock_price(
             symbol, 
             interval="daily",
             date=date, 
-            top_k=day_peroid
+            top_k=day_peroid + days
         )
-        df_week = OHLCData(df_day).daily_week() 
+        return IndicatorCalculator.calc_ema_macd_kdj_boll(df_day) if len(df_day) > 0 else df_day
+
+    def load_context(self, 
+            symbol: str, 
+            day_peroid: int=400, 
+            week_peroid: int=50,
+            date: str=None,
+            history: pd.DataFrame=None
+        ) -> Dict[str, Any]:
+        """取数并计算指标，与具体策略无关：同一 symbol/date 的多个策略可共享该结果"""
+        # 1. 获取股票价格数据；传入 load_history 的结果时按日期截取，日线指标为因果计算，无需重算
+        if history is None:
+            df_day = self.db.query_stock_price(
+                symbol, 
+                interval="daily",
+                date=date, 
+                top_k=day_peroid
+            )
+        else:
+            df_day = history[history["date"] < date[:10] + "~"].tail(day_peroid).reset_index(drop=True)
 
         # 2. 数据有效性检验
-        if len(df_day) < 1 or len(df_week) < 1:
+        if len(df_day) < 1:
             raise ValueError(f"{symbol}/{date} ohlc data is none")
 
-        latest_day  = df_day['date'].iat[-1].split()[0]
-        latest_week = df_week['date'].iat[-1].split()[0]
-        covered_week = days_delta(latest_week, 7) 
-        if latest_day != date or covered_week < date:
+        # 日期均为 ISO 字符串，直接截取比较；末根周线即 latest_day 所在周（周一起始），
+        # latest_day == date 时周线必然覆盖 date，无需先做周线聚合
+        latest_day = df_day['date'].iat[-1][:10]
+        if latest_day != date:
+            day = np.datetime64(latest_day, "D")
+            latest_week = str(day - (day.astype(np.int64) + 3) % 7)
             raise PriceDataInvalidError(symbol, date, latest_day, latest_week)
         
         # 3. 股票基本信息
         stock_info = self.db.query_stock_info(symbol)
         stock_info = stock_info["info"].iat[0] if isinstance(stock_info, pd.DataFrame) and not stock_info.empty else "{}"
         try:
-            data = json.loads(stock_info)
+            try:
+                data = orjson.loads(stock_info)
+            except orjson.JSONDecodeError:
+                # 库中 info 由 json.dumps 写入，可能含 orjson 不接受的 NaN/Infinity，回退标准库
+                data = json.loads(stock_info)
             #用周期内最后一天收盘价格替换实时价格数据，避免数据错乱
             if not is_today(date) and not is_yesterday(date) or "currentPrice" not in data:
                 data["currentPrice"] = df_day['close'].iat[-1]
@@ -84,25 +161,35 @@ class Strategy:
             logger.error(f"{symbol} update current price error:{e}")
 
 
-        # 4. 加指标
-        df_day = IndicatorCalculator.calc_ema_macd_kdj_boll(df_day)
-        df_week = IndicatorCalculator.calc_ema_macd_kdj_boll(
-            df_week, 
-            ema_short=6, 
-            ema_long=13, 
-            macd_signal=4
-        )
+        # 4. 周线与指标；截取历史时周线末行随 date 变化，按截取后的日线重新聚合计算
+        if history is None:
+            df_day, df_week = self._with_indicators(symbol, df_day)
+        else:
+            df_week = self._week_indicators(OHLCData(df_day).daily_week())
+        return {"df_day": df_day, "df_week": df_week, "stock_info": stock_info, "latest_day": latest_day}
+
+    def prepare(self, 
+            symbol: str, 
+            day_peroid: int=400, 
+            week_peroid: int=50,
+            date: str=None,
+            context: Dict[str, Any]=None
+        ) -> Tuple[Optional[str], str]:
+        """构造 prompt，返回 (prompt, 最新交易日)；未传入 context 时自行取数，无需调用 LLM 时 prompt 为 None"""
+        context = context or self.load_context(symbol, day_peroid, week_peroid, date)
 
         # 5. 策略分析
-        analysis = self.analyze(df_day, df_week, stock_info)
+        analysis = self.analyze(context["df_day"], context["df_week"], context["stock_info"])
+        if not self.should_invoke_llm(analysis):
+            return None, context["latest_day"]
 
         # 6. 构造 prompt
         prompt = self.build_prompt(analysis)
         logger.debug(prompt)
+        return prompt, context["latest_day"]
 
-        # 7. 调用 LLM
-        report = self.llm.chat(prompt)
-
+    def parse_report(self, symbol: str, latest_day: str, report: str) -> Dict[str, Any]:
+        """解析 LLM 返回：去掉 think 块并提取 score"""
         # 8. remove think block
         think_str = "</think>"
         idx = report.rfind(think_str)
@@ -111,7 +198,7 @@ class Strategy:
  
         # 9. 提取 score
         score = None
-        matches = re.findall(r"<score>([-+]?\d*\.?\d+)</score>", report)
+        matches = _SCORE_RE.findall(report)
         if matches:
             try:
                 score = float(matches[-1])
@@ -128,6 +215,36 @@ class Strategy:
             "report": report
         }
 
+    def quant(self, 
+            symbol: str, 
+            day_peroid: int=400, 
+            week_peroid: int=50,
+            date: str=None,
+            context: Dict[str, Any]=None,
+            refresh: bool=False
+        ) -> Dict[str, Any]:
+        prompt, latest_day = self.prepare(symbol, day_peroid, week_peroid, date, context)
+        # 7. 调用 LLM
+        report = self.llm.chat(prompt, **self._chat_kwargs(refresh)) if prompt is not None else self.NO_PATTERN_REPORT
+        return self.parse_report(symbol, latest_day, report)
+
+    async def aquant(self, 
+            symbol: str, 
+            day_peroid: int=400, 
+            week_peroid: int=50,
+            date: str=None,
+            context: Dict[str, Any]=None,
+            refresh: bool=False
+        ) -> Dict[str, Any]:
+        """quant 的异步版本：取数与指标计算仍为同步，仅 LLM 调用让出事件循环"""
+        prompt, latest_day = self.prepare(symbol, day_peroid, week_peroid, date, context)
+        report = await self.llm.achat(prompt, **self._chat_kwargs(refresh)) if prompt is not None else self.NO_PATTERN_REPORT
+        return self.parse_report(symbol, latest_day, report)
+
+    async def quant_batch(self, symbols: List[str], date: str=None, **kwargs) -> List[Any]:
+        """并发分析多只股票，结果与 symbols 一一对应；单只失败时对应位置为异常对象，不影响其他股票"""
+        return await asyncio.gather(*(self.aquant(s, date=date, **kwargs) for s in symbols), return_exceptions=True)
+
 
 # =====================
 # 三层滤网策略
@@ -135,6 +252,13 @@ class Strategy:
 class ThreeFilterStrategy(Strategy):
     name: str = "three_filters"
 
+    @staticmethod
+    def _tail_rows(df: pd.DataFrame, n: int = 2) -> List[Dict[str, Any]]:
+        """末尾 n 行转为 {列: 标量} 字典（时间正序）：先切出 n 行再整体转 object 数组，
+        避免逐列 to_numpy（字符串列会整列物化）和 iloc 逐行构造 Series"""
+        rows = df.iloc[-n:].to_numpy(dtype=object).tolist()
+        return [dict(zip(df.columns, row)) for row in rows]
+
     def analyze(self, 
             df_day: pd.DataFrame, 
             df_week: pd.DataFrame,
@@ -143,8 +267,8 @@ class ThreeFilterStrategy(Strategy):
         if len(df_day) < 2 or len(df_week) < 2:
             raise ValueError(f"Three Filters analysis error: data isn't enough.")
 
-        today, yesterday = df_day.iloc[-1], df_day.iloc[-2]
-        this_week, last_week = df_week.iloc[-1], df_week.iloc[-2]
+        yesterday, today = self._tail_rows(df_day)
+        last_week, this_week = self._tail_rows(df_week)
 
         return {
             "today": today,
@@ -157,6 +281,7 @@ class ThreeFilterStrategy(Strategy):
             "week_short_slope": this_week["ema_short"] - last_week["ema_short"],
             "week_long_slope": this_week["ema_long"] - last_week["ema_long"],
             "week_hist_slope": this_week["hist"] - last_week["hist"],
+            "prev_week_short_slope": last_week["ema_short"] - df_week["ema_short"].iat[-3],
             "df_day": df_day,
             "df_week": df_week,
             "stock_info": stock_info,
@@ -164,7 +289,7 @@ class ThreeFilterStrategy(Strategy):
 
     def build_prompt(self, analysis: Dict[str, Any]) -> str:
         today, yesterday = analysis["today"], analysis["yesterday"]
-        this_week, last_week = analysis["this_week"], analysis["last_week"]
+        this_week = analysis["this_week"]
         df_day, df_week = analysis["df_day"], analysis["df_week"]
 
         return f"""
@@ -193,7 +318,7 @@ class ThreeFilterStrategy(Strategy):
 - **长期EMA值**：{this_week["ema_long"]:.2f}，斜率：{analysis["week_long_slope"]:.2f}
 - **EMA关系**：短期EMA {"高于" if this_week["ema_short"]>this_week["ema_long"] else "低于"}长期EMA
 - **EMA斜率关系**：短期EMA斜率 {"高于" if analysis["week_short_slope"]>analysis["week_long_slope"] else "低于"}长期EMA斜率
-- **短期EMA斜率变化**：前一周为{last_week["ema_short"] - df_week.iloc[-3]["ema_short"]:.2f}，当前{"高于" if analysis["week_short_slope"] > (last_week["ema_short"] - df_week.iloc[-3]["ema_short"]) else "低于"}前一周
+- **短期EMA斜率变化**：前一周为{analysis["prev_week_short_slope"]:.2f}，当前{"高于" if analysis["week_short_slope"] > analysis["prev_week_short_slope"] else "低于"}前一周
 - **MACD线值**：{this_week["macd"]:.2f}
 - **MACD信号线值**：{this_week["signal"]:.2f}
 - **MACD柱状图值**：{this_week["hist"]:.2f}，斜率：{analysis["week_hist_slope"]:.2f}
@@ -220,8 +345,8 @@ class ThreeFilterStrategy(Strategy):
   - 变化率：{(today["volume"] - yesterday["volume"]) * 100 / (yesterday["volume"] or 1):.1f}%
 
 ### 历史数据参考
-- **周K线（近20周）**：{df_week[self.columns].tail(20).to_dict(orient="records")}
-- **日K线（近40日）**：{df_day[self.columns].tail(40).to_dict(orient="records")}
+- **周K线（近20周）**：{self._records(df_week, 20)}
+- **日K线（近40日）**：{self._records(df_day, 40)}
 
 ---
 
@@ -398,33 +523,6 @@ class ThreeFilterStrategy(Strategy):
 **现在，请基于上述数据和框架开始你的专业分析。**
 """
 
-
-        return f"""
-你是一名专业的量化分析师，擅长通过技术形态识别股价趋势。  
-请严格根据以下数据进行分析：
-### 三层滤网策略详细分析
-### 股票信息
-- 股票代码：{today["symbol"]}, 国家：{today["country"]}, 行业：{today["industry"]}, 板块：{today["sector"]}
-
-### 周K线分析
-- 周EMA均线指标：当前交易周短期EMA为{this_week["ema_short"]:.2f}, 长期EMA为{this_week["ema_long"]:.2f}, 短期EMA斜率为{analysis["week_short_slope"]:.2f}, 长期EMA斜率{analysis["week_long_slope"]:.2f}, 短期EMA{"高于" if this_week["ema_short"]>this_week["ema_long"] else "低于"}长期EMA, 短期EMA斜率{"高于" if analysis["week_short_slope"]>analysis["week_long_slope"] else "低于"}长期EMA斜率, 前一交易周短期EMA斜率为{last_week["ema_short"] - df_week.iloc[-3]["ema_short"]:.2f}, 当前交易周短期EMA斜率{"高于" if analysis["week_short_slope"] > (last_week["ema_short"] - df_week.iloc[-3]["ema_short"]) else "低于"}前一时间点短期EMA斜率；
-- 周MACD指标：当前交易周MACD线为{this_week["macd"]:.2f}, 信号线为{this_week["signal"]:.2f}, MACD柱状图为{this_week["hist"]:.2f}, MACD柱状图斜率为{analysis["week_hist_slope"]:.2f}
-
-### 日K线分析
-- 日K基础信息：开盘:{today["open"]:.2f}，最低:{today["low"]:.2f}，最高:{today["high"]:.2f}，收盘价:{today["close"]:.2f}，涨跌幅:{(today["close"]/yesterday["close"]-1)*100:.2f}%
-- 日均线指标：当前交易日短期EMA为{today["ema_short"]:.2f}, 长期EMA为{today["ema_long"]:.2f}, 短期EMA斜率为{analysis["day_short_slope"]:.2f}, 长期EMA斜率{analysis["day_long_slope"]:.2f}
-- 日MACD指标：当前交易日MACD线为{today["macd"]:.2f}, 信号线为{today["signal"]:.2f}, MACD柱状图为{today["hist"]:.2f}, MACD柱状图斜率为{analysis["day_hist_slope"]:.2f}
-- 日成交量：当前交易日成交量为{today["volume"]:.0f}，前一个交易日成交量为{yesterday["volume"]:.0f}
-
-### 历史数据参考
-- 周K线（近20周）：{df_week[self.columns].tail(20).to_dict(orient="records")}
-- 日K线（近40日）：{df_day[self.columns].tail(40).to_dict(orient="records")}
-
-### 综合评分
-基于上述分析结论，对{today["symbol"]}未来一周价格走势给出[-1,1]区间内的综合评分，并在最后输出 <score> 标签。
-<score></score>
-"""
-
 # =====================
 # 双底策略(DoubleBottomStrategy)
 # =====================
@@ -450,33 +548,34 @@ class DoubleBottomStrategy(Strategy):
             df_week: pd.DataFrame,
             stock_info: str,
         ) -> Dict[str, Any]:
-        df = df_day.tail(self.window).reset_index(drop=True)
-        prices = df["close"].values
+        # 价格窗口直接取 ndarray 视图
+        prices = df_day["close"].to_numpy()[-self.window:]
 
         # 找两个低点（简单用最小值+次小值来模拟）
         first_idx = prices.argmin()
-        first_low = prices[first_idx]
+        first_low = float(prices[first_idx])
 
         # 次低点必须在first_idx之后
         second_idx = first_idx + prices[first_idx+1:].argmin() + 1 if first_idx < len(prices)-1 else None
-        second_low = prices[second_idx] if second_idx else None
+        second_low = float(prices[second_idx]) if second_idx else None
 
-        is_double_bottom = False
-        if second_low and second_low >= first_low * (1 - self.tolerance):
-            is_double_bottom = True
+        # 转为 Python float 后比较，免去 numpy 标量运算开销
+        is_double_bottom = bool(second_low) and second_low >= first_low * (1 - self.tolerance)
 
         return {
             "window": self.window,
-            "first_low": float(first_low),
-            "second_low": float(second_low) if second_low else None,
+            "first_low": first_low,
+            "second_low": second_low or None,
             "first_idx": int(first_idx),
             "second_idx": int(second_idx) if second_idx else None,
             "is_double_bottom": is_double_bottom,
-            "df_day": df,
             "stock_info": stock_info,
         }
 
 
+    def should_invoke_llm(self, analysis: Dict[str, Any]) -> bool:
+        return analysis["is_double_bottom"]
+
     def build_prompt(self, analysis: Dict[str, Any]) -> str:
         if analysis["is_double_bottom"]:
             pattern_desc = f"在最近 {analysis['window']} 个交易日内，出现双底形态：第一个底部价位 {analysis['first_low']:.2f}，第二个底部价位 {analysis['second_low']:.2f}，符合双底条件。"
@@ -530,32 +629,33 @@ class DoubleTopStrategy(Strategy):
             df_week: pd.DataFrame,
             stock_info: str,
         ) -> Dict[str, Any]:
-        df = df_day.tail(self.window).reset_index(drop=True)
-        prices = df["close"].values
+        # 价格窗口直接取 ndarray 视图
+        prices = df_day["close"].to_numpy()[-self.window:]
 
         # 找第一个高点
         first_idx = prices.argmax()
-        first_high = prices[first_idx]
+        first_high = float(prices[first_idx])
 
         # 第二个高点（必须在 first_idx 之后）
         second_idx = first_idx + prices[first_idx+1:].argmax() + 1 if first_idx < len(prices)-1 else None
-        second_high = prices[second_idx] if second_idx else None
+        second_high = float(prices[second_idx]) if second_idx else None
 
-        is_double_top = False
-        if second_high and abs(second_high - first_high) / first_high <= self.tolerance:
-            is_double_top = True
+        # 阈值乘到 first_high 上省去除法（价格为正，两者等价）
+        is_double_top = bool(second_high) and abs(second_high - first_high) <= first_high * self.tolerance
 
         return {
             "window": self.window,
-            "first_high": float(first_high),
-            "second_high": float(second_high) if second_high else None,
+            "first_high": first_high,
+            "second_high": second_high or None,
             "first_idx": int(first_idx),
             "second_idx": int(second_idx) if second_idx else None,
             "is_double_top": is_double_top,
-            "df_day": df,
             "stock_info": stock_info
         }
 
+    def should_invoke_llm(self, analysis: Dict[str, Any]) -> bool:
+        return analysis["is_double_top"]
+
     def build_prompt(self, analysis: Dict[str, Any]) -> str:
         if analysis["is_double_top"]:
             pattern_desc = f"在最近 {analysis['window']} 个交易日内，出现双顶形态：第一个顶点 {analysis['first_high']:.2f}，第二个顶点 {analysis['second_high']:.2f}，符合双顶条件。"
@@ -610,8 +710,8 @@ class CupHandleStrategy(Strategy):
             df_week: pd.DataFrame,
             stock_info: str,
         ) -> Dict[str, Any]:
-        df = df_day.tail(self.window).reset_index(drop=True)
-        prices = df["close"].values
+        # 价格窗口直接取 ndarray 视图
+        prices = df_day["close"].to_numpy()[-self.window:]
 
         left_high = prices[0]
         bottom_idx = prices.argmin()
@@ -625,7 +725,9 @@ class CupHandleStrategy(Strategy):
         handle_exists = False
         if bottom_idx < len(prices) - self.handle_window:
             handle_part = prices[bottom_idx+1:]
-            if handle_part.min() > bottom and handle_part.argmin() < self.handle_window:
+            # 一次 argmin 同时得到柄部最低点位置与价格
+            handle_idx = handle_part.argmin()
+            if handle_part[handle_idx] > bottom and handle_idx < self.handle_window:
                 handle_exists = True
 
         is_cup_handle = is_cup and handle_exists
@@ -637,10 +739,12 @@ class CupHandleStrategy(Strategy):
             "bottom": float(bottom),
             "bottom_idx": int(bottom_idx),
             "is_cup_handle": is_cup_handle,
-            "df_day": df,
             "stock_info": stock_info,
         }
 
+    def should_invoke_llm(self, analysis: Dict[str, Any]) -> bool:
+        return analysis["is_cup_handle"]
+
     def build_prompt(self, analysis: Dict[str, Any]) -> str:
         if analysis["is_cup_handle"]:
             pattern_desc = f"在最近 {analysis['window']} 个交易日内，检测到杯柄形态：左高点 {analysis['left_high']:.2f}，右高点 {analysis['right_high']:.2f}，底部 {analysis['bottom']:.2f}，形态成立。"
@@ -703,7 +807,7 @@ class StrategyHelper():
         self.db = db
         self.strategies = [StrategyFactory.create(name, llm=self.llm, db=self.db) for name in strategy_names]
 
-    def analysis(self, symbol:str, date:str, update:bool=False) -> bool:
+    def analysis(self, symbol:str, date:str, update:bool=False, history:pd.DataFrame=None) -> bool:
         date = datetime.strptime(date, "%Y-%m-%d").strftime("%Y-%m-%d")
         if not update:
             df = self.db.query_analysis_report(symbol, date)         
@@ -711,18 +815,26 @@ class StrategyHelper():
                 logger.info(f"🟡 Analysis report {symbol} on {date} already exists.")
                 return True
         
+        if not self.strategies: return False
         data = dict()
-        for strategy in self.strategies:
-            try:
-                res = strategy.quant(symbol, date=date)
+        try:
+            # 取数与指标只计算一次，各策略共享；多个策略时并发调用 LLM
+            context = self.strategies[0].load_context(symbol, date=date, history=history)
+            quant = lambda strategy: strategy.quant(symbol, date=date, context=context, refresh=update)
+            if len(self.strategies) > 1:
+                with ThreadPoolExecutor(max_workers=len(self.strategies)) as pool:
+                    results = list(pool.map(quant, self.strategies))
+            else:
+                results = [quant(self.strategies[0])]
+            for res in results:
                 data[f"{res['strategy']}_score"]  = res["score"], 
                 data[f"{res['strategy']}_report"] = res["report"]
-            except PriceDataInvalidError as e:
-                logger.warning(e)
-                return False
-            except Exception as e:
-                logger.error(f"🚫{symbol} {date} quant error:{e}")
-                return False
+        except PriceDataInvalidError as e:
+            logger.warning(e)
+            return False
+        except Exception as e:
+            logger.error(f"🚫{symbol} {date} quant error:{e}")
+            return False
 
         if len(data) > 0:
             data["symbol"]  = symbol
@@ -731,26 +843,40 @@ class StrategyHelper():
             self.db.update_analysis_report(pd.DataFrame(data))
             return True
 
+    def _load_history(self, symbol: str, days: int) -> Optional[pd.DataFrame]:
+        """日线与指标按整个回溯区间只取一次、算一次，逐日截取使用；失败时返回 None，逐日单独取数"""
+        if days <= 1 or not self.strategies: return None
+        try:
+            history = self.strategies[0].load_history(symbol, days)
+            return None if history.empty else history
+        except Exception as e:
+            logger.error(f"🚫{symbol} load price history error:{e}")
+            return None
+
     def update(self, symbol: str, days: int=10, update=False, cp:Checkpoint=None):
         today = datetime.today()
-        for day in range(days):
-            date = today - timedelta(days=day)
-            date_str = date.strftime("%Y-%m-%d")
-            
-            if not update:
-                df = self.db.query_analysis_report(symbol, date=date_str, top_k=1)        
-                if isinstance(df, pd.DataFrame) and not df.empty:
-                    logger.info(f"🟡 Analysis report for {symbol} ({date_str}) already exists.")
-                    continue
+        dates = [(today - timedelta(days=day)).strftime("%Y-%m-%d") for day in range(days)]
+        # 已有报告的日期一次查出，免去逐日查询
+        reported = self.db.query_reported_dates(symbol, dates[-1], dates[0]) if dates and not update else set()
+        history, loaded = None, False
+        for date_str in dates:
+            if date_str in reported:
+                logger.info(f"🟡 Analysis report for {symbol} ({date_str}) already exists.")
+                continue
             if cp is not None and not cp.seek({"symbol": symbol, "date":date_str}):
                 logger.info(F"🟡 Skip Analysis report {symbol}({date_str}) by checkpoint mode")
                 continue
-            if self.analysis(symbol, date_str, update=update):
+            # 遇到首个待分析日期才取历史，全部已完成时不取数
+            if not loaded:
+                history, loaded = self._load_history(symbol, days), True
+            if self.analysis(symbol, date_str, update=update, history=history):
                 logger.info(F"💚Analysis report {symbol} at {date_str} finished.")
 
-    def update_latest(self, symbols:list[str]=CRITICAL_STOCKS_US, days:int=2, update:bool=False):
-        for symbol in symbols:
-            self.update(symbol, days=days, update=update)
+    def update_latest(self, symbols:list[str]=CRITICAL_STOCKS_US, days:int=2, update:bool=False, max_workers:int=8):
+        # 各 symbol 相互独立，耗时在 DB 与 LLM 往返，用线程池并发
+        if not symbols: return
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(symbols))) as pool:
+            list(pool.map(lambda symbol: self.update(symbol, days=days, update=update), symbols))
 
 if __name__ == "__main__":
     from quant.llm import ModelScopeClinet
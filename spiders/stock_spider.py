@@ -87,14 +87,14 @@ class BaseStockSpider(ABC):
         """获取某个股票所有 interval 的最新数据"""
         dfs = []
         for interval in self.intervals:
-            df = self.db.latest_stock_price(symbol, interval)
-            if df.empty: 
+            latest = self.db.latest_stock_price(symbol, interval)
+            if latest is None: 
                 latest_date = "1970-01-01" 
             else:
                 if interval in MIN_INTERVAL:
-                    latest_date = df.at[0, "date"].split()[0]
+                    latest_date = latest[0].split()[0]
                 else:
-                    latest_date = days_delta(df.at[0, "date"].split()[0], 1)
+                    latest_date = days_delta(latest[0].split()[0], 1)
             if latest_date >= self.today:
                 logger.info(f"{interval} price data is latest.")
                 continue